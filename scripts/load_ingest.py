@@ -0,0 +1,145 @@
+"""
+Load generator for the ingestion server (gps_cleaner.ingest).
+
+Simulated devices drive slowly along a line; concurrent clients post NDJSON
+batches, each client owning its own devices so every device's pings arrive in
+order. After sending stops, the script waits for the server to drain and
+reports processed pings/sec (from GET /stats) over the whole run, not just how
+fast pings were accepted into the buffers.
+
+    python scripts/load_ingest.py --host 127.0.0.1 --port 8001 --devices 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+
+class DeviceTrack:
+    def __init__(self, device_id: str, start: datetime):
+        self.device_id = device_id
+        self.t = start
+        self.lat = 19.45 + random.uniform(-0.05, 0.05)
+        self.lon = 72.88 + random.uniform(-0.05, 0.05)
+        self.seq = 0
+
+    def rewind(self, count: int) -> None:
+        # Pings the server did not accept are generated again, with the same times
+        self.t -= timedelta(seconds=5 * count)
+        self.seq -= count
+
+    def next_ping(self) -> dict:
+        self.t += timedelta(seconds=5)
+        self.lat += random.uniform(0, 0.0002)
+        self.lon += random.uniform(0, 0.0002)
+        self.seq += 1
+        return {
+            "device_id": self.device_id,
+            "id": f"{self.device_id}-{self.seq}",
+            "gpstime": self.t.isoformat(),
+            "lat": self.lat,
+            "lon": self.lon,
+        }
+
+
+async def request(host: str, port: int, method: str, path: str, body: bytes = b"") -> Tuple[int, bytes]:
+    reader, writer = await asyncio.open_connection(host, port)
+    head = (
+        f"{method} {path} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Content-Type: application/x-ndjson\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode("ascii")
+    writer.write(head + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    status_line, _, rest = response.partition(b"\r\n")
+    return int(status_line.split()[1]), rest.partition(b"\r\n\r\n")[2]
+
+
+async def get_stats(host: str, port: int) -> dict:
+    _, body = await request(host, port, "GET", "/stats")
+    return json.loads(body)
+
+
+async def client(args, tracks, stop_at: float, counters: dict) -> None:
+    # Only this client posts for these devices, so their batches stay in time order
+    turn = 0
+    while time.perf_counter() < stop_at:
+        track = tracks[turn % len(tracks)]
+        turn += 1
+        batch = [track.next_ping() for _ in range(args.batch_size)]
+        body = "\n".join(json.dumps(ping) for ping in batch).encode("utf-8")
+        status, body = await request(args.host, args.port, "POST", "/ingest", body)
+        counters["requests"] += 1
+        if status == 202:
+            counters["pings"] += args.batch_size
+        elif status == 503:
+            # Only the first `accepted` pings were queued: rewind the track to resend the rest
+            accepted = json.loads(body)["accepted"]
+            counters["pings"] += accepted
+            counters["backpressure"] += 1
+            track.rewind(args.batch_size - accepted)
+            await asyncio.sleep(1)
+        else:
+            counters["errors"] += 1
+
+
+async def wait_drained(args, timeout: float) -> dict:
+    # Drained once nothing is buffered or in a running batch; the newest few
+    # pings of each device stay held back by the server until more arrive
+    deadline = time.perf_counter() + timeout
+    while True:
+        stats = await get_stats(args.host, args.port)
+        if (stats["buffered"] == 0 and stats["in_flight"] == 0) or time.perf_counter() > deadline:
+            return stats
+        await asyncio.sleep(0.2)
+
+
+async def run(args) -> None:
+    start = datetime.now(timezone.utc)
+    tracks = [DeviceTrack(f"dev-{i}", start) for i in range(args.devices)]
+    counters = {"requests": 0, "pings": 0, "backpressure": 0, "errors": 0}
+    concurrency = min(args.concurrency, len(tracks))
+    before = await get_stats(args.host, args.port)
+
+    t0 = time.perf_counter()
+    stop_at = t0 + args.duration
+    await asyncio.gather(*(client(args, tracks[j::concurrency], stop_at, counters) for j in range(concurrency)))
+    sent_elapsed = time.perf_counter() - t0
+    after = await wait_drained(args, args.drain_timeout)
+    elapsed = time.perf_counter() - t0
+    processed = after["processed"] - before["processed"]
+
+    print(f"requests:        {counters['requests']}")
+    print(f"pings accepted:  {counters['pings']}")
+    print(f"pings processed: {processed}")
+    print(f"pings late:      {after['late'] - before['late']}")
+    print(f"pings failed:    {after['failed'] - before['failed']}")
+    print(f"503 responses:   {counters['backpressure']}")
+    print(f"errors:          {counters['errors']}")
+    print(f"accepted/sec:    {counters['pings'] / sent_elapsed:.0f}")
+    print(f"processed/sec:   {processed / elapsed:.0f}  (until drained, {elapsed:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the GPS cleaner ingestion server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--devices", type=int, default=100, help="Number of simulated devices")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client connections")
+    parser.add_argument("--batch-size", type=int, default=50, help="Pings per request")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to send")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="Max seconds to wait for the server to drain")
+
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import yaml
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 
 @dataclass
@@ -15,6 +15,25 @@ class Config:
     ema_alpha: float
     idle_speed_kmh: float
     idle_min_duration_sec: float
+    trip_gap_sec: float
+    trip_split_idle_sec: float
+    trip_min_distance_m: float
+    trip_min_duration_sec: float
+    ingest_buffer_size: int
+    ingest_flush_size: int
+    ingest_flush_interval_sec: float
+    ingest_put_timeout_sec: float
+    ingest_workers: int
+    ingest_history_size: int
+    ingest_context_size: int
+    ingest_max_devices: int
+    ingest_device_idle_sec: float
+    ingest_max_body_bytes: int
+    road_network_path: Optional[str]
+    snap_search_radius_m: float
+    snap_sigma_m: float
+    snap_beta_m: float
+    snap_max_candidates: int
 
     @staticmethod
     def from_dict(d: Dict[str, Any]) -> "Config":
@@ -28,6 +47,25 @@ class Config:
             ema_alpha=float(d.get("ema_alpha", 0.25)),
             idle_speed_kmh=float(d.get("idle_speed_kmh", 3)),
             idle_min_duration_sec=float(d.get("idle_min_duration_sec", 120)),
+            trip_gap_sec=float(d.get("trip_gap_sec", 600)),
+            trip_split_idle_sec=float(d.get("trip_split_idle_sec", 300)),
+            trip_min_distance_m=float(d.get("trip_min_distance_m", 100)),
+            trip_min_duration_sec=float(d.get("trip_min_duration_sec", 60)),
+            ingest_buffer_size=int(d.get("ingest_buffer_size", 2000)),
+            ingest_flush_size=int(d.get("ingest_flush_size", 500)),
+            ingest_flush_interval_sec=float(d.get("ingest_flush_interval_sec", 5)),
+            ingest_put_timeout_sec=float(d.get("ingest_put_timeout_sec", 2)),
+            ingest_workers=int(d.get("ingest_workers", 0)),
+            ingest_history_size=int(d.get("ingest_history_size", 10000)),
+            ingest_context_size=int(d.get("ingest_context_size", 20)),
+            ingest_max_devices=int(d.get("ingest_max_devices", 10000)),
+            ingest_device_idle_sec=float(d.get("ingest_device_idle_sec", 3600)),
+            ingest_max_body_bytes=int(d.get("ingest_max_body_bytes", 10_000_000)),
+            road_network_path=d.get("road_network_path") or None,
+            snap_search_radius_m=float(d.get("snap_search_radius_m", 50)),
+            snap_sigma_m=float(d.get("snap_sigma_m", 10)),
+            snap_beta_m=float(d.get("snap_beta_m", 20)),
+            snap_max_candidates=int(d.get("snap_max_candidates", 5)),
         )
 
 
@@ -0,0 +1,161 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from multiprocessing.util import Finalize
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import Config, load_config
+from .idling import IdlingDetector
+from .io import load_fleet_points, save_json, to_processed_json
+from .models import Ping, ProcessedResult
+from .pipeline import build_stages
+from .trips import TripSegmenter
+from .utils_geo import epoch_seconds, track_steps
+
+# Rows of the shared float64 block
+_LAT, _LON, _TIME, _LAT_SM, _LON_SM = range(5)
+_N_FLOAT_ROWS = 5
+
+# Per-worker state set by _init_worker
+_worker: Dict[str, object] = {}
+
+
+def run_fleet(
+    tracks: Dict[str, List[Ping]], cfg: Config, max_workers: Optional[int] = None
+) -> Dict[str, ProcessedResult]:
+    """
+    Run the cleaning chain for many device tracks on a process pool.
+
+    Coordinates and timestamps of all tracks are laid out column-wise in
+    shared memory. Workers receive only (start, stop) offsets, read their
+    slice in place and write the jitter mask and smoothed coordinates back
+    into shared output buffers; only idle segment offsets and per-trip
+    aggregates travel back through the pool. Pickled traffic therefore
+    does not depend on how many points each track holds.
+    """
+    device_ids = [d for d, points in tracks.items() if points]
+    sizes = [len(tracks[d]) for d in device_ids]
+    n = sum(sizes)
+    if n == 0:
+        return {}
+
+    offsets = np.concatenate(([0], np.cumsum(sizes))).tolist()
+    spans = list(zip(offsets[:-1], offsets[1:]))
+
+    float_shm = shared_memory.SharedMemory(create=True, size=_N_FLOAT_ROWS * n * 8)
+    mask_shm = shared_memory.SharedMemory(create=True, size=n)
+    try:
+        columns = np.ndarray((_N_FLOAT_ROWS, n), dtype=np.float64, buffer=float_shm.buf)
+        jitter = np.ndarray((n,), dtype=np.bool_, buffer=mask_shm.buf)
+        for device_id, (start, stop) in zip(device_ids, spans):
+            points = tracks[device_id]
+            columns[_LAT, start:stop] = [p.lat for p in points]
+            columns[_LON, start:stop] = [p.lon for p in points]
+            columns[_TIME, start:stop] = [epoch_seconds(p.gpstime) for p in points]
+
+        workers = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(float_shm.name, mask_shm.name, n, cfg),
+        ) as pool:
+            chunksize = max(1, len(spans) // (4 * workers))
+            outputs = list(pool.map(_process_span, spans, chunksize=chunksize))
+
+        results: Dict[str, ProcessedResult] = {}
+        for device_id, (start, stop), (segments, trip_summary) in zip(device_ids, spans, outputs):
+            points = tracks[device_id]
+            flags = jitter[start:stop].tolist()
+            lats_sm = columns[_LAT_SM, start:stop].tolist()
+            lons_sm = columns[_LON_SM, start:stop].tolist()
+            results[device_id] = ProcessedResult(
+                raw_points=points,
+                cleaned_points=[
+                    Ping(id=p.id, gpstime=p.gpstime, lat=lat, lon=lon)
+                    for p, flag, lat, lon in zip(points, flags, lats_sm, lons_sm)
+                    if not flag
+                ],
+                jitter_point_ids=[p.id for p, flag in zip(points, flags) if flag],
+                idling_points=IdlingDetector.points_from_segments(points, segments),
+                trips=TripSegmenter.trips_from_summary(points, trip_summary),
+            )
+
+        # Views must be released before the blocks can be closed
+        del columns, jitter
+        return results
+    finally:
+        float_shm.close()
+        float_shm.unlink()
+        mask_shm.close()
+        mask_shm.unlink()
+
+
+def _init_worker(float_name: str, mask_name: str, n: int, cfg: Config) -> None:
+    # Attach once per worker; tasks then only carry offsets
+    float_shm = shared_memory.SharedMemory(name=float_name)
+    mask_shm = shared_memory.SharedMemory(name=mask_name)
+    _worker["shms"] = (float_shm, mask_shm)
+    _worker["columns"] = np.ndarray((_N_FLOAT_ROWS, n), dtype=np.float64, buffer=float_shm.buf)
+    _worker["jitter"] = np.ndarray((n,), dtype=np.bool_, buffer=mask_shm.buf)
+    _worker["stages"] = build_stages(cfg)
+    Finalize(None, _detach_worker, exitpriority=10)
+
+
+def _detach_worker() -> None:
+    # Views must be released before the blocks can be closed
+    _worker.pop("columns", None)
+    _worker.pop("jitter", None)
+    for shm in _worker.pop("shms", ()):
+        shm.close()
+
+
+def _process_span(span: Tuple[int, int]) -> Tuple[List[Tuple[int, int, float]], Dict[str, np.ndarray]]:
+    start, stop = span
+    jd, smoother, id_detector, matcher, segmenter = _worker["stages"]
+    columns = _worker["columns"]
+    jitter = _worker["jitter"]
+
+    lats = columns[_LAT, start:stop].tolist()
+    lons = columns[_LON, start:stop].tolist()
+    times_s = columns[_TIME, start:stop].tolist()
+
+    steps = track_steps(lats, lons, times_s)
+
+    mask = np.asarray(jd.detect_arrays(lats, lons, times_s, steps), dtype=bool)
+    jitter[start:stop] = mask
+
+    kept = ~mask
+    lats_sm, lons_sm = smoother.smooth_arrays(
+        columns[_LAT, start:stop][kept].tolist(), columns[_LON, start:stop][kept].tolist()
+    )
+    if matcher is not None:
+        lats_sm, lons_sm = matcher.match_arrays(lats_sm, lons_sm)
+    # Jitter points have no smoothed position
+    columns[_LAT_SM, start:stop] = np.nan
+    columns[_LON_SM, start:stop] = np.nan
+    columns[_LAT_SM, start:stop][kept] = lats_sm
+    columns[_LON_SM, start:stop][kept] = lons_sm
+
+    segments = id_detector.detect_segments(lats, lons, times_s, steps)
+    trip_summary = segmenter.summarize(lats, lons, times_s, mask, segments, steps)
+    return segments, trip_summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPS cleaner: fleet batch processing on a process pool")
+    parser.add_argument("--input", required=True, help="Path to input JSON file with pings carrying a device_id")
+    parser.add_argument("--output", required=True, help="Path to output processed JSON file keyed by device_id")
+    parser.add_argument("--config", required=True, help="Path to YAML config file with thresholds")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+
+    args = parser.parse_args()
+    cfg = load_config(args.config)
+    results = run_fleet(load_fleet_points(args.input), cfg, max_workers=args.workers)
+    save_json(args.output, {device_id: to_processed_json(r) for device_id, r in results.items()})
+
+
+if __name__ == "__main__":
+    main()
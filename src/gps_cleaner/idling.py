@@ -1,7 +1,7 @@
-from typing import List
+from typing import List, Optional, Sequence, Tuple
 
 from .models import Ping, IdlingPoint
-from .utils_geo import haversine_distance_m, speeds_kmh
+from .utils_geo import epoch_seconds, track_steps
 
 
 class IdlingDetector:
@@ -15,53 +15,64 @@ class IdlingDetector:
         self.idle_min_duration_sec = idle_min_duration_sec
 
     def detect(self, points: List[Ping]) -> List[IdlingPoint]:
-        n = len(points)
+        segments = self.detect_segments(
+            [p.lat for p in points],
+            [p.lon for p in points],
+            [epoch_seconds(p.gpstime) for p in points],
+        )
+        return self.points_from_segments(points, segments)
+
+    def detect_segments(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        times_s: Sequence[float],
+        steps: Optional[Tuple[List[float], List[float], List[float]]] = None,
+    ) -> List[Tuple[int, int, float]]:
+        """
+        Idle segments on columnar inputs as (first index, last index, duration_sec).
+        steps is the output of track_steps() when the caller already has it.
+        """
+        n = len(lats)
         if n < 2:
             return []
 
-        # Compute segment speeds and deltas
-        distances_m = [0.0]
-        deltas_s = [0.0]
-        for i in range(1, n):
-            d = haversine_distance_m(points[i - 1].lat, points[i - 1].lon, points[i].lat, points[i].lon)
-            dt = (points[i].gpstime - points[i - 1].gpstime).total_seconds()
-            distances_m.append(d)
-            deltas_s.append(max(dt, 0.0))
-
-        speeds = speeds_kmh(distances_m, deltas_s)
+        # Segment speeds and deltas
+        _, deltas_s, speeds = steps if steps is not None else track_steps(lats, lons, times_s)
 
-        idling_points: List[IdlingPoint] = []
+        segments: List[Tuple[int, int, float]] = []
         i = 0
         while i < n:
             if speeds[i] < self.idle_speed_kmh:
                 # Start of potential idle segment
                 j = i
                 total_duration = 0.0
-                lats = []
-                lons = []
                 while j < n and speeds[j] < self.idle_speed_kmh:
-                    lats.append(points[j].lat)
-                    lons.append(points[j].lon)
                     total_duration += deltas_s[j] if j > 0 else 0.0
                     j += 1
 
                 if total_duration >= self.idle_min_duration_sec:
-                    # Representative point at centroid; time range from i to j-1
-                    lat_c = sum(lats) / len(lats)
-                    lon_c = sum(lons) / len(lons)
-                    start_time = points[i].gpstime
-                    end_time = points[j - 1].gpstime
-                    idling_points.append(
-                        IdlingPoint(
-                            lat=lat_c,
-                            lon=lon_c,
-                            start_time=start_time,
-                            end_time=end_time,
-                            duration_sec=total_duration,
-                            count=len(lats),
-                        )
-                    )
+                    segments.append((i, j - 1, total_duration))
                 i = j
             else:
                 i += 1
 
+        return segments
+
+    @staticmethod
+    def points_from_segments(points: List[Ping], segments: List[Tuple[int, int, float]]) -> List[IdlingPoint]:
+        idling_points: List[IdlingPoint] = []
+        for i, j, duration in segments:
+            # Representative point at centroid; time range from i to j
+            seg = points[i : j + 1]
+            idling_points.append(
+                IdlingPoint(
+                    lat=sum(p.lat for p in seg) / len(seg),
+                    lon=sum(p.lon for p in seg) / len(seg),
+                    start_time=points[i].gpstime,
+                    end_time=points[j].gpstime,
+                    duration_sec=duration,
+                    count=len(seg),
+                )
+            )
+        return idling_points
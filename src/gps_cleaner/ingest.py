@@ -0,0 +1,538 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import Config, load_config
+from .io import ping_from_dict, to_processed_json
+from .models import IdlingPoint, Ping, ProcessedResult
+from .pipeline import build_stages
+from .utils_geo import epoch_seconds, track_steps
+
+logger = logging.getLogger(__name__)
+
+
+def parse_batch(body: bytes) -> List[Tuple[str, Ping]]:
+    """
+    Parse a batch of pings sent as a JSON array or as NDJSON (one object per line).
+    Each object carries a "device_id" in addition to the regular ping fields.
+    Times without an offset are taken as UTC so one device's pings stay comparable.
+    """
+    text = body.decode("utf-8").strip()
+    if not text:
+        return []
+
+    if text.startswith("["):
+        items = json.loads(text)
+    else:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    pings = []
+    for item in items:
+        ping = ping_from_dict(item)
+        if ping.gpstime.tzinfo is None:
+            ping.gpstime = ping.gpstime.replace(tzinfo=timezone.utc)
+        pings.append((str(item["device_id"]), ping))
+    return pings
+
+
+@dataclass
+class IdleRun:
+    """
+    Low-speed run still open at the end of a chunk. Constant size however long
+    the device stays parked; the centroid comes from the coordinate sums.
+    """
+    start_time: datetime
+    end_time: datetime
+    duration_sec: float
+    lat_sum: float
+    lon_sum: float
+    count: int
+
+
+@dataclass
+class StreamState:
+    """
+    What one chunk of a device's stream hands to the next: the raw tail to
+    prepend, the newest pings held back until the Hampel window has points on
+    both sides of them, the last smoothed position and the open low-speed run.
+    """
+    context: List[Ping] = field(default_factory=list)
+    pending: List[Ping] = field(default_factory=list)
+    ema_seed: Optional[Tuple[float, float]] = None
+    idle_run: Optional[IdleRun] = None
+
+
+def process_chunk(
+    stream: StreamState, chunk: List[Ping], cfg: Config
+) -> Tuple[ProcessedResult, List[bool], StreamState]:
+    """
+    Run the cleaning chain on the next time-sorted chunk of one device's stream.
+
+    The stream's raw tail is prepended so the jitter windows and step speeds
+    see the points before the chunk, the EMA continues from the last smoothed
+    position and the open low-speed run keeps accumulating. The last half
+    Hampel window of pings is held back and output with the next chunk, once
+    points after it have arrived.
+
+    Returns output for the pings released by this chunk, their jitter flags and
+    the next state. Idle segments are those that ended in the released pings
+    plus the open run once it is long enough; the open run is reported again,
+    longer, by later chunks.
+    """
+    jd, smoother, id_detector, matcher, _ = build_stages(cfg)
+    # Effective window as in hampel_outliers
+    window = cfg.hampel_window_size if cfg.hampel_window_size >= 3 and cfg.hampel_window_size % 2 else 5
+    points = stream.context + sorted(stream.pending + chunk, key=lambda p: p.gpstime)
+    k = len(stream.context)
+    m = max(len(points) - window // 2, k)
+    released = points[k:m]
+
+    lats = [p.lat for p in points]
+    lons = [p.lon for p in points]
+    times_s = [epoch_seconds(p.gpstime) for p in points]
+    steps = track_steps(lats, lons, times_s)
+
+    jitter_flags = jd.detect_arrays(lats, lons, times_s, steps)[k:m]
+    kept = [p for p, flag in zip(released, jitter_flags) if not flag]
+
+    kept_lats = [p.lat for p in kept]
+    kept_lons = [p.lon for p in kept]
+    if stream.ema_seed is not None:
+        # Continue the EMA from the last smoothed position, then drop the seed
+        lats_sm, lons_sm = smoother.smooth_arrays([stream.ema_seed[0]] + kept_lats, [stream.ema_seed[1]] + kept_lons)
+        lats_sm, lons_sm = lats_sm[1:], lons_sm[1:]
+    else:
+        lats_sm, lons_sm = smoother.smooth_arrays(kept_lats, kept_lons)
+    ema_seed = (lats_sm[-1], lons_sm[-1]) if kept else stream.ema_seed
+
+    cleaned_points = [Ping(id=p.id, gpstime=p.gpstime, lat=lat, lon=lon) for p, lat, lon in zip(kept, lats_sm, lons_sm)]
+    if matcher is not None:
+        cleaned_points = matcher.match(cleaned_points)
+
+    # Same rule as IdlingDetector.detect_segments, one point at a time
+    _, deltas_s, speeds = steps
+    idling_points: List[IdlingPoint] = []
+    run = replace(stream.idle_run) if stream.idle_run is not None else None
+    for i in range(k, m):
+        p = points[i]
+        if speeds[i] < id_detector.idle_speed_kmh:
+            if run is None:
+                run = IdleRun(p.gpstime, p.gpstime, deltas_s[i], p.lat, p.lon, 1)
+            else:
+                run.end_time = p.gpstime
+                run.duration_sec += deltas_s[i]
+                run.lat_sum += p.lat
+                run.lon_sum += p.lon
+                run.count += 1
+        elif run is not None:
+            if run.duration_sec >= id_detector.idle_min_duration_sec:
+                idling_points.append(_idling_point(run))
+            run = None
+    if run is not None and run.duration_sec >= id_detector.idle_min_duration_sec:
+        idling_points.append(_idling_point(run))
+
+    result = ProcessedResult(
+        raw_points=released,
+        cleaned_points=cleaned_points,
+        jitter_point_ids=[p.id for p, flag in zip(released, jitter_flags) if flag],
+        idling_points=idling_points,
+    )
+    # Tail for the Hampel window, the speed z-score and the bearing/speed steps into the next chunk
+    context = points[max(m - max(cfg.ingest_context_size, window), 0) : m]
+    return result, jitter_flags, StreamState(context, points[m:], ema_seed, run)
+
+
+def _idling_point(run: IdleRun) -> IdlingPoint:
+    return IdlingPoint(
+        lat=run.lat_sum / run.count,
+        lon=run.lon_sum / run.count,
+        start_time=run.start_time,
+        end_time=run.end_time,
+        duration_sec=run.duration_sec,
+        count=run.count,
+    )
+
+
+def history_result(
+    raw_points: List[Ping],
+    jitter_flags: List[bool],
+    cleaned_points: List[Ping],
+    idling_points: List[IdlingPoint],
+    cfg: Config,
+) -> ProcessedResult:
+    """
+    Assemble a device's accumulated stream and summarize its trips.
+    """
+    *_, segmenter = build_stages(cfg)
+    times = [p.gpstime for p in raw_points]
+    segments = [
+        (bisect_left(times, ip.start_time), bisect_right(times, ip.end_time) - 1, ip.duration_sec)
+        for ip in idling_points
+    ]
+    summary = segmenter.summarize(
+        [p.lat for p in raw_points],
+        [p.lon for p in raw_points],
+        [epoch_seconds(t) for t in times],
+        jitter_flags,
+        segments,
+    )
+    return ProcessedResult(
+        raw_points=raw_points,
+        cleaned_points=cleaned_points,
+        jitter_point_ids=[p.id for p, flag in zip(raw_points, jitter_flags) if flag],
+        idling_points=idling_points,
+        trips=segmenter.trips_from_summary(raw_points, summary),
+    )
+
+
+class _DeviceHistory:
+    """
+    Processed output of one device's stream, trimmed to the newest max_points raw pings.
+    """
+
+    def __init__(self, max_points: int):
+        self.max_points = max_points
+        self.stream = StreamState()
+        self.raw_points: List[Ping] = []
+        self.jitter_flags: List[bool] = []
+        self.cleaned_points: List[Ping] = []
+        self.idling_points: List[IdlingPoint] = []
+
+    def extend(self, result: ProcessedResult, jitter_flags: List[bool]) -> None:
+        self.raw_points.extend(result.raw_points)
+        self.jitter_flags.extend(jitter_flags)
+        self.cleaned_points.extend(result.cleaned_points)
+        if result.idling_points:
+            # An open idle run is reported again by each chunk it grows in; drop the earlier copy
+            first_start = result.idling_points[0].start_time
+            while self.idling_points and self.idling_points[-1].end_time >= first_start:
+                self.idling_points.pop()
+            self.idling_points.extend(result.idling_points)
+
+        excess = len(self.raw_points) - self.max_points
+        if excess > 0:
+            del self.raw_points[:excess]
+            del self.jitter_flags[:excess]
+            oldest = self.raw_points[0].gpstime
+            del self.cleaned_points[: bisect_left(self.cleaned_points, oldest, key=lambda p: p.gpstime)]
+            self.idling_points = [ip for ip in self.idling_points if ip.end_time >= oldest]
+
+    def last_time(self):
+        return self.stream.context[-1].gpstime if self.stream.context else None
+
+
+class IngestionServer:
+    """
+    ASGI app that accepts batched pings for many devices over HTTP.
+
+    Pings are queued per device in bounded buffers. A consumer task per device
+    dispatches up to ingest_flush_size pings at a time to a worker pool running
+    the jitter/smoothing/idling chain (process_chunk). A raw tail, the EMA
+    position and the open idle run carry from one chunk to the next, and the
+    newest half Hampel window of pings waits for the next chunk. Idles, trips
+    and smoothing then follow a single pass over the stream; jitter flags can
+    still differ slightly, because the speed z-score sees only the
+    ingest_context_size pings before each chunk instead of the whole track.
+    Held-back pings show up in GET /devices/<id> once the next chunk arrives.
+
+    A buffer that has not filled up is dispatched
+    once ingest_flush_interval_sec has passed since its first ping, so devices
+    that report slowly still get processed within a bounded delay.
+
+    While a device's buffer is full, requests wait up to ingest_put_timeout_sec
+    and then answer 503 with the number of pings accepted, so clients slow down
+    instead of growing server memory. Memory is bounded the same way across
+    devices: at most ingest_max_devices are tracked (pings for further devices
+    get a 503), a device silent for ingest_device_idle_sec is dropped with its
+    history, and request bodies over ingest_max_body_bytes get a 413.
+
+    Routes:
+    - POST /ingest           JSON array or NDJSON batch of pings
+    - GET  /stats            counters, buffered pings and pings in running batches
+    - GET  /devices/<id>     processed JSON of the device's newest ingest_history_size pings, with trips
+    """
+
+    def __init__(self, cfg: Config, executor: Optional[Executor] = None):
+        self.cfg = cfg
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._buffers: Dict[str, asyncio.Queue] = {}
+        self._consumers: Dict[str, asyncio.Task] = {}
+        self.histories: Dict[str, _DeviceHistory] = {}
+        self.stats = {"received": 0, "rejected": 0, "processed": 0, "late": 0, "failed": 0, "batches": 0, "expired": 0}
+        # Pings taken off a buffer whose batch has not been processed yet
+        self._in_flight = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            # Spawned (not forked) workers so they don't inherit open client sockets
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.cfg.ingest_workers or None,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            if not self._owns_executor:
+                raise
+            # A worker died (e.g. OOM-killed) and took the pool down: replace it once and retry
+            logger.warning("Worker pool broken, starting a new one")
+            if self._executor is executor:
+                executor.shutdown(wait=False)
+                self._executor = None
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+
+    def _buffer_for(self, device_id: str) -> Optional[asyncio.Queue]:
+        queue = self._buffers.get(device_id)
+        if queue is None:
+            if len(self._buffers) >= self.cfg.ingest_max_devices:
+                return None
+            queue = asyncio.Queue(maxsize=self.cfg.ingest_buffer_size)
+            self._buffers[device_id] = queue
+            self.histories[device_id] = _DeviceHistory(self.cfg.ingest_history_size)
+            self._consumers[device_id] = asyncio.create_task(self._consume(device_id, queue))
+        return queue
+
+    async def submit(self, pings: List[Tuple[str, Ping]]) -> int:
+        """
+        Queue pings in request order. Returns how many were accepted before
+        ingest_put_timeout_sec elapsed on a full buffer or a ping arrived for a
+        new device while ingest_max_devices are already tracked.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.cfg.ingest_put_timeout_sec
+        accepted = 0
+        for device_id, ping in pings:
+            queue = self._buffer_for(device_id)
+            if queue is None:
+                break
+            try:
+                queue.put_nowait(ping)
+            except asyncio.QueueFull:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(queue.put(ping), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            accepted += 1
+
+        self.stats["received"] += accepted
+        self.stats["rejected"] += len(pings) - accepted
+        return accepted
+
+    async def _consume(self, device_id: str, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        history = self.histories[device_id]
+        while True:
+            try:
+                chunk = [await asyncio.wait_for(queue.get(), timeout=self.cfg.ingest_device_idle_sec)]
+            except asyncio.TimeoutError:
+                # Nothing can be queued between this check and the cleanup: no await in between
+                if queue.empty():
+                    self._buffers.pop(device_id, None)
+                    self._consumers.pop(device_id, None)
+                    self.histories.pop(device_id, None)
+                    self.stats["expired"] += 1
+                    return
+                continue
+
+            # In flight from the moment a ping leaves its buffer, while the batch is still filling
+            self._in_flight += 1
+            deadline = loop.time() + self.cfg.ingest_flush_interval_sec
+            while len(chunk) < self.cfg.ingest_flush_size:
+                try:
+                    chunk.append(queue.get_nowait())
+                    self._in_flight += 1
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    chunk.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                    self._in_flight += 1
+                except asyncio.TimeoutError:
+                    break
+
+            size = len(chunk)
+            try:
+                # Devices may upload out of order; the chain expects time-sorted points.
+                # Pings older than the already released stream cannot be merged back in.
+                last_time = history.last_time()
+                if last_time is not None:
+                    chunk = [p for p in chunk if p.gpstime >= last_time]
+                chunk.sort(key=lambda p: p.gpstime)
+                self.stats["late"] += size - len(chunk)
+                if chunk:
+                    result, jitter_flags, history.stream = await self._run(
+                        process_chunk, history.stream, chunk, self.cfg
+                    )
+                    history.extend(result, jitter_flags)
+                    self.stats["processed"] += len(result.raw_points)
+                    self.stats["batches"] += 1
+            except Exception:
+                # These pings were already acknowledged with a 202
+                logger.exception("Failed to process %d pings for device %s", len(chunk), device_id)
+                self.stats["failed"] += len(chunk)
+            finally:
+                self._in_flight -= size
+                for _ in range(size):
+                    queue.task_done()
+
+    async def drain(self) -> None:
+        """
+        Wait until every queued ping has been processed.
+        """
+        for queue in list(self._buffers.values()):
+            await queue.join()
+
+    async def close(self) -> None:
+        await self.drain()
+        for task in self._consumers.values():
+            task.cancel()
+        await asyncio.gather(*self._consumers.values(), return_exceptions=True)
+        self._consumers.clear()
+        self._buffers.clear()
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def __call__(self, scope: Dict[str, Any], receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+
+        if path == "/ingest" and method == "POST":
+            body = await _read_body(scope, receive, self.cfg.ingest_max_body_bytes)
+            if body is None:
+                await _send_json(send, 413, {"error": f"Body larger than {self.cfg.ingest_max_body_bytes} bytes"})
+                return
+            try:
+                pings = parse_batch(body)
+            except (ValueError, KeyError, TypeError) as e:
+                await _send_json(send, 400, {"error": f"Invalid batch: {e}"})
+                return
+
+            accepted = await self.submit(pings)
+            if accepted < len(pings):
+                # Only the first `accepted` pings were queued; the client should resend the rest
+                await _send_json(
+                    send,
+                    503,
+                    {"accepted": accepted, "rejected": len(pings) - accepted},
+                    headers=[(b"retry-after", b"1")],
+                )
+                return
+            await _send_json(send, 202, {"accepted": accepted})
+
+        elif path == "/stats" and method == "GET":
+            depths = {device_id: q.qsize() for device_id, q in self._buffers.items()}
+            await _send_json(
+                send,
+                200,
+                {**self.stats, "devices": len(depths), "buffered": sum(depths.values()), "in_flight": self._in_flight},
+            )
+
+        elif path.startswith("/devices/") and method == "GET":
+            device_id = path[len("/devices/"):]
+            history = self.histories.get(device_id)
+            if history is None or not history.raw_points:
+                await _send_json(send, 404, {"error": f"No processed data for device {device_id}"})
+                return
+            # Copies: the consumer keeps extending the history while trips are summarized
+            result = await self._run(
+                history_result,
+                list(history.raw_points),
+                list(history.jitter_flags),
+                list(history.cleaned_points),
+                list(history.idling_points),
+                self.cfg,
+            )
+            await _send_json(send, 200, to_processed_json(result))
+
+        else:
+            await _send_json(send, 404, {"error": "Not found"})
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _read_body(scope: Dict[str, Any], receive, max_bytes: int) -> Optional[bytes]:
+    # None when the body exceeds max_bytes; checked before and while reading
+    for name, value in scope.get("headers", []):
+        if name == b"content-length" and value.isdigit() and int(value) > max_bytes:
+            return None
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > max_bytes:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _send_json(send, status: int, obj: Dict[str, Any], headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+    body = json.dumps(obj).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                *(headers or []),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPS cleaner: async ingestion server for batched pings")
+    parser.add_argument("--config", required=True, help="Path to YAML config file with thresholds")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8001, help="Port to listen on")
+
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("uvicorn is required to serve the ingestion app: pip install uvicorn")
+
+    uvicorn.run(IngestionServer(load_config(args.config)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 import json
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any
 
 from dateutil import parser
 
-from .models import Ping, ProcessedResult, IdlingPoint
+from .models import Ping, ProcessedResult, IdlingPoint, Trip
 
 
 def load_json_points(path: str | Path) -> List[Ping]:
@@ -13,19 +14,39 @@ def load_json_points(path: str | Path) -> List[Ping]:
     with p.open("r", encoding="utf-8") as f:
         data = json.load(f)
 
-    points: List[Ping] = []
-    for item in data:
-        pid = str(item["id"])
-        gpstime = parser.isoparse(str(item["gpstime"]))
-        lat = float(item["lat"])
-        lon = float(item["lon"])
-        points.append(Ping(id=pid, gpstime=gpstime, lat=lat, lon=lon))
+    points: List[Ping] = [ping_from_dict(item) for item in data]
 
     # Ensure sorted by time
     points.sort(key=lambda x: x.gpstime)
     return points
 
 
+def load_fleet_points(path: str | Path) -> Dict[str, List[Ping]]:
+    """
+    Load a JSON array of pings for many devices, grouped by their "device_id".
+    """
+    p = Path(path)
+    with p.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    tracks: Dict[str, List[Ping]] = {}
+    for item in data:
+        tracks.setdefault(str(item["device_id"]), []).append(ping_from_dict(item))
+
+    # Ensure each track is sorted by time
+    for points in tracks.values():
+        points.sort(key=lambda x: x.gpstime)
+    return tracks
+
+
+def ping_from_dict(item: Dict[str, Any]) -> Ping:
+    pid = str(item["id"])
+    gpstime = parser.isoparse(str(item["gpstime"]))
+    lat = float(item["lat"])
+    lon = float(item["lon"])
+    return Ping(id=pid, gpstime=gpstime, lat=lat, lon=lon)
+
+
 def save_json(path: str | Path, obj: Dict[str, Any]) -> None:
     p = Path(path)
     p.parent.mkdir(parents=True, exist_ok=True)
@@ -61,6 +82,27 @@ def to_processed_json(result: ProcessedResult) -> Dict[str, Any]:
             }
             for ip in result.idling_points
         ],
+        "trips": [_trip_dict(t) for t in result.trips],
+    }
+
+
+def _trip_dict(trip: Trip) -> Dict[str, Any]:
+    return {
+        "start_time": trip.start_time.isoformat(),
+        "end_time": trip.end_time.isoformat(),
+        "start_lat": trip.start_lat,
+        "start_lon": trip.start_lon,
+        "end_lat": trip.end_lat,
+        "end_lon": trip.end_lon,
+        "point_count": trip.point_count,
+        "distance_m": trip.distance_m,
+        "duration_sec": trip.duration_sec,
+        "moving_time_sec": trip.moving_time_sec,
+        "idle_time_sec": trip.idle_time_sec,
+        "avg_speed_kmh": trip.avg_speed_kmh,
+        "max_speed_kmh": trip.max_speed_kmh,
+        "p95_speed_kmh": trip.p95_speed_kmh,
+        "jitter_rate": trip.jitter_rate,
     }
 
 
@@ -71,6 +113,7 @@ def to_geojson(result: ProcessedResult) -> Dict[str, Any]:
     - Cleaned route LineString
     - Jitter points as Point features
     - Idling points as Point features
+    - Trips as LineString features with per-trip summary properties
     """
     raw_coords = [[p.lon, p.lat] for p in result.raw_points]
     cleaned_coords = [[p.lon, p.lat] for p in result.cleaned_points]
@@ -103,6 +146,23 @@ def to_geojson(result: ProcessedResult) -> Dict[str, Any]:
             }
         )
 
+    # Each trip as the part of the cleaned route between its start and end time
+    cleaned_times = [p.gpstime for p in result.cleaned_points]
+    trip_features = []
+    for trip in result.trips:
+        i0 = bisect_left(cleaned_times, trip.start_time)
+        i1 = bisect_right(cleaned_times, trip.end_time)
+        coords = cleaned_coords[i0:i1]
+        if len(coords) < 2:
+            coords = [[trip.start_lon, trip.start_lat], [trip.end_lon, trip.end_lat]]
+        trip_features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": coords},
+                "properties": {"type": "trip", **_trip_dict(trip)},
+            }
+        )
+
     fc = {
         "type": "FeatureCollection",
         "features": [
@@ -118,6 +178,7 @@ def to_geojson(result: ProcessedResult) -> Dict[str, Any]:
             },
             *jitter_features,
             *idling_features,
+            *trip_features,
         ],
     }
     return fc
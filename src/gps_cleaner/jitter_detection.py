@@ -1,10 +1,10 @@
-from typing import List, Tuple
+from typing import List, Optional, Sequence, Tuple
 
 from .models import Ping
 from .utils_geo import (
-    haversine_distance_m,
+    epoch_seconds,
     bearing_deg,
-    speeds_kmh,
+    track_steps,
     compute_bearing_changes,
     robust_z_scores,
     hampel_outliers,
@@ -37,25 +37,33 @@ class JitterDetector:
         self.hampel_n_sigma = hampel_n_sigma
 
     def detect(self, points: List[Ping]) -> List[bool]:
-        n = len(points)
+        return self.detect_arrays(
+            [p.lat for p in points],
+            [p.lon for p in points],
+            [epoch_seconds(p.gpstime) for p in points],
+        )
+
+    def detect_arrays(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        times_s: Sequence[float],
+        steps: Optional[Tuple[List[float], List[float], List[float]]] = None,
+    ) -> List[bool]:
+        """
+        Same as detect() on columnar inputs; times_s are UTC epoch seconds.
+        steps is the output of track_steps() when the caller already has it.
+        """
+        n = len(lats)
         if n < 3:
             return [False] * n
 
-        lats = [p.lat for p in points]
-        lons = [p.lon for p in points]
-
-        # Distances and time deltas
-        distances_m = [0.0]
-        deltas_s = [0.0]
+        # Distances, time deltas and speeds
+        distances_m, deltas_s, speeds = steps if steps is not None else track_steps(lats, lons, times_s)
         bearings = [0.0]
         for i in range(1, n):
-            d = haversine_distance_m(lats[i - 1], lons[i - 1], lats[i], lons[i])
-            dt = (points[i].gpstime - points[i - 1].gpstime).total_seconds()
-            distances_m.append(d)
-            deltas_s.append(max(dt, 0.0))
             bearings.append(bearing_deg(lats[i - 1], lons[i - 1], lats[i], lons[i]))
 
-        speeds = speeds_kmh(distances_m, deltas_s)
         bearing_changes = compute_bearing_changes(bearings)
 
         speed_z = robust_z_scores(speeds)
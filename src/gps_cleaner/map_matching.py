@@ -0,0 +1,299 @@
+import json
+import math
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from .models import Ping
+from .utils_geo import EARTH_RADIUS_M
+
+# Cell indices are offset to stay non-negative when packed into one int64 key
+_CELL_OFFSET = 1 << 30
+_NEIGHBOURS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+
+class RoadNetwork:
+    """
+    Road segments in a local planar frame (meters) with a uniform grid index.
+
+    Coordinates are projected equirectangularly around the mean latitude of
+    the network, which is accurate to well under a meter over city-sized
+    extracts. Each segment is registered in the grid cells it passes through,
+    so all segments within cell_size_m of a point are found in the 3x3 block
+    of cells around it.
+    """
+
+    def __init__(self, lines: Sequence[Sequence[Tuple[float, float]]], cell_size_m: float):
+        coords = [np.asarray(line, dtype=float) for line in lines if len(line) >= 2]
+        if not coords:
+            raise ValueError("Road network contains no LineString with at least two coordinates")
+
+        self.cell_size_m = float(cell_size_m)
+        lat0 = float(np.mean(np.concatenate(coords)[:, 1]))
+        self._ky = math.radians(1.0) * EARTH_RADIUS_M
+        self._kx = self._ky * math.cos(math.radians(lat0))
+
+        # Coordinates are (lon, lat) pairs as in GeoJSON
+        start = np.concatenate([c[:-1] for c in coords])
+        end = np.concatenate([c[1:] for c in coords])
+        self.seg_a = np.column_stack(self.project(start[:, 1], start[:, 0]))
+        self.seg_b = np.column_stack(self.project(end[:, 1], end[:, 0]))
+        self._build_index()
+
+    def __len__(self) -> int:
+        return len(self.seg_a)
+
+    def project(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        return np.asarray(lons, dtype=float) * self._kx, np.asarray(lats, dtype=float) * self._ky
+
+    def unproject(self, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        return np.asarray(y) / self._ky, np.asarray(x) / self._kx
+
+    def _cell(self, v: np.ndarray) -> np.ndarray:
+        return np.floor(v / self.cell_size_m).astype(np.int64)
+
+    @staticmethod
+    def _cell_key(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+        return (cx + _CELL_OFFSET) * (2 * _CELL_OFFSET) + (cy + _CELL_OFFSET)
+
+    def _build_index(self) -> None:
+        # Split segments into pieces at most one cell long so registration is
+        # O(length / cell) per segment rather than O(bbox area / cell^2)
+        d = self.seg_b - self.seg_a
+        pieces = np.maximum(1, np.ceil(np.hypot(d[:, 0], d[:, 1]) / self.cell_size_m)).astype(np.int64)
+        piece_seg = np.repeat(np.arange(len(pieces)), pieces)
+        k = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        t0 = (k / pieces[piece_seg])[:, None]
+        t1 = ((k + 1) / pieces[piece_seg])[:, None]
+        p0 = self.seg_a[piece_seg] + t0 * d[piece_seg]
+        p1 = self.seg_a[piece_seg] + t1 * d[piece_seg]
+
+        # Each piece touches at most 2x2 cells of its bounding box
+        lo = np.minimum(p0, p1)
+        hi = np.maximum(p0, p1)
+        cx0, cy0 = self._cell(lo[:, 0]), self._cell(lo[:, 1])
+        nx = self._cell(hi[:, 0]) - cx0 + 1
+        ny = self._cell(hi[:, 1]) - cy0 + 1
+        counts = nx * ny
+        owner = np.repeat(np.arange(len(counts)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = cx0[owner] + local // ny[owner]
+        cy = cy0[owner] + local % ny[owner]
+        keys = self._cell_key(cx, cy)
+        seg_ids = piece_seg[owner]
+
+        # Neighbouring pieces of one segment share cells; keep one entry per (cell, segment)
+        order = np.lexsort((seg_ids, keys))
+        keys, seg_ids = keys[order], seg_ids[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = (keys[1:] != keys[:-1]) | (seg_ids[1:] != seg_ids[:-1])
+        self._cell_keys = keys[first]
+        self._cell_segs = seg_ids[first]
+
+    def candidates(
+        self, x: np.ndarray, y: np.ndarray, radius_m: float, max_candidates: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Nearest segments within radius_m of each point, closest first.
+        Returns (segment ids, distances, projected positions) of shapes (n, k), (n, k), (n, k, 2);
+        missing candidates have id -1, distance inf and position NaN.
+        """
+        n = len(x)
+        k = max_candidates
+        cand_seg = np.full((n, k), -1, dtype=np.int64)
+        cand_dist = np.full((n, k), np.inf)
+        cand_xy = np.full((n, k, 2), np.nan)
+        if n == 0:
+            return cand_seg, cand_dist, cand_xy
+
+        # Look up the 3x3 cells around every point in the sorted key table
+        qx = (self._cell(x)[:, None] + _NEIGHBOURS[:, 0]).ravel()
+        qy = (self._cell(y)[:, None] + _NEIGHBOURS[:, 1]).ravel()
+        qkeys = self._cell_key(qx, qy)
+        left = np.searchsorted(self._cell_keys, qkeys, side="left")
+        counts = np.searchsorted(self._cell_keys, qkeys, side="right") - left
+        total = int(counts.sum())
+        if total == 0:
+            return cand_seg, cand_dist, cand_xy
+
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        seg = self._cell_segs[np.repeat(left, counts) + within]
+        pt = np.repeat(np.arange(n * len(_NEIGHBOURS)) // len(_NEIGHBOURS), counts)
+
+        # A segment spanning several cells is seen more than once per point
+        pairs = np.unique(pt * len(self) + seg)
+        pt = pairs // len(self)
+        seg = pairs % len(self)
+
+        # Point-to-segment distance for all pairs at once
+        p = np.column_stack((x[pt], y[pt]))
+        a = self.seg_a[seg]
+        d = self.seg_b[seg] - a
+        len2 = np.einsum("ij,ij->i", d, d)
+        t = np.divide(np.einsum("ij,ij->i", p - a, d), len2, out=np.zeros_like(len2), where=len2 > 0)
+        proj = a + np.clip(t, 0.0, 1.0)[:, None] * d
+        dist = np.hypot(p[:, 0] - proj[:, 0], p[:, 1] - proj[:, 1])
+
+        keep = dist <= radius_m
+        pt, seg, dist, proj = pt[keep], seg[keep], dist[keep], proj[keep]
+
+        # Rank candidates per point by distance and keep the k closest
+        order = np.lexsort((dist, pt))
+        pt, seg, dist, proj = pt[order], seg[order], dist[order], proj[order]
+        rank = np.arange(len(pt)) - np.searchsorted(pt, pt, side="left")
+        top = rank < k
+        pt, rank = pt[top], rank[top]
+        cand_seg[pt, rank] = seg[top]
+        cand_dist[pt, rank] = dist[top]
+        cand_xy[pt, rank] = proj[top]
+        return cand_seg, cand_dist, cand_xy
+
+
+class MapMatcher:
+    """
+    Snap a cleaned route onto a RoadNetwork with an HMM decoded by Viterbi.
+
+    Hidden states are the candidate segments near each point. Emission
+    probability is Gaussian in the point-to-segment distance (sigma_m).
+    Transition probability decays exponentially with the difference between
+    the distance of consecutive snapped positions and the distance of the
+    observed points (beta_m), which favours staying on roads that follow the
+    track instead of jumping to parallel ones. Straight-line distance stands
+    in for routed distance, so this is a lightweight matcher, not a router.
+    Points with no road within search_radius_m keep their position and split
+    the track into independently decoded runs.
+    """
+
+    def __init__(
+        self,
+        network: RoadNetwork,
+        search_radius_m: float,
+        sigma_m: float,
+        beta_m: float,
+        max_candidates: int,
+    ):
+        self.network = network
+        self.search_radius_m = search_radius_m
+        self.sigma_m = sigma_m
+        self.beta_m = beta_m
+        self.max_candidates = max_candidates
+
+    def match(self, points: List[Ping]) -> List[Ping]:
+        if not points:
+            return []
+        lats, lons = self.match_arrays([p.lat for p in points], [p.lon for p in points])
+        return [Ping(id=p.id, gpstime=p.gpstime, lat=lat, lon=lon) for p, lat, lon in zip(points, lats, lons)]
+
+    def match_arrays(self, lats: Sequence[float], lons: Sequence[float]) -> Tuple[List[float], List[float]]:
+        """
+        Snapped coordinates for a time-ordered track.
+        """
+        if len(lats) == 0:
+            return [], []
+
+        x, y = self.network.project(lats, lons)
+        cand_seg, cand_dist, cand_xy = self.network.candidates(x, y, self.search_radius_m, self.max_candidates)
+        emission = -0.5 * (cand_dist / self.sigma_m) ** 2
+
+        out_x = x.copy()
+        out_y = y.copy()
+        has_candidate = cand_seg[:, 0] >= 0
+        for start, stop in _runs(has_candidate):
+            states = self._viterbi(x[start:stop], y[start:stop], emission[start:stop], cand_xy[start:stop])
+            snapped = cand_xy[np.arange(start, stop), states]
+            out_x[start:stop] = snapped[:, 0]
+            out_y[start:stop] = snapped[:, 1]
+
+        out_lats, out_lons = self.network.unproject(out_x, out_y)
+        return out_lats.tolist(), out_lons.tolist()
+
+    def _viterbi(self, x: np.ndarray, y: np.ndarray, emission: np.ndarray, cand_xy: np.ndarray) -> np.ndarray:
+        n, k = emission.shape
+        back = np.zeros((n, k), dtype=np.int64)
+        score = emission[0]
+        cols = np.arange(k)
+        for t in range(1, n):
+            d_obs = math.hypot(x[t] - x[t - 1], y[t] - y[t - 1])
+            diff = cand_xy[t - 1][:, None, :] - cand_xy[t][None, :, :]
+            d_snap = np.hypot(diff[..., 0], diff[..., 1])
+            transition = -np.abs(d_snap - d_obs) / self.beta_m
+            transition[np.isnan(transition)] = -np.inf
+
+            total = score[:, None] + transition
+            back[t] = np.argmax(total, axis=0)
+            score = total[back[t], cols] + emission[t]
+
+        states = np.empty(n, dtype=np.int64)
+        states[-1] = int(np.argmax(score))
+        for t in range(n - 1, 0, -1):
+            states[t - 1] = back[t, states[t]]
+        return states
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    (start, stop) index ranges of consecutive True values.
+    """
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def load_road_network(path: str, cell_size_m: float) -> RoadNetwork:
+    """
+    Load road lines from a GeoJSON file (LineString / MultiLineString features)
+    or an OSM XML extract (ways tagged highway=*). Cached per path and file
+    modification time, so repeated pipeline runs in one process share the index
+    and an updated file is reloaded on the next call.
+    """
+    return _load_road_network(str(path), cell_size_m, Path(path).stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=4)
+def _load_road_network(path: str, cell_size_m: float, mtime_ns: int) -> RoadNetwork:
+    p = Path(path)
+    suffix = p.suffix.lower()
+    if suffix in (".geojson", ".json"):
+        lines = _geojson_lines(p)
+    elif suffix in (".osm", ".xml"):
+        lines = _osm_lines(p)
+    else:
+        raise ValueError(f"Unsupported road network format: {p.name} (expected .geojson, .json, .osm or .xml)")
+    return RoadNetwork(lines, cell_size_m=cell_size_m)
+
+
+def _geojson_lines(path: Path) -> List[List[Tuple[float, float]]]:
+    with path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if data.get("type") == "FeatureCollection":
+        geometries = [feat.get("geometry") or {} for feat in data.get("features", [])]
+    elif data.get("type") == "Feature":
+        geometries = [data.get("geometry") or {}]
+    else:
+        geometries = [data]
+
+    lines = []
+    for geom in geometries:
+        if geom.get("type") == "LineString":
+            lines.append([tuple(c[:2]) for c in geom["coordinates"]])
+        elif geom.get("type") == "MultiLineString":
+            lines.extend([tuple(c[:2]) for c in part] for part in geom["coordinates"])
+    return lines
+
+
+def _osm_lines(path: Path) -> List[List[Tuple[float, float]]]:
+    nodes = {}
+    lines = []
+    for _, elem in ET.iterparse(str(path), events=("end",)):
+        if elem.tag == "node":
+            nodes[elem.get("id")] = (float(elem.get("lon")), float(elem.get("lat")))
+            elem.clear()
+        elif elem.tag == "way":
+            if any(tag.get("k") == "highway" for tag in elem.iter("tag")):
+                refs = [nd.get("ref") for nd in elem.iter("nd")]
+                lines.append([nodes[r] for r in refs if r in nodes])
+            elem.clear()
+    return lines
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import List, Optional
 
@@ -21,8 +21,29 @@ class IdlingPoint:
     count: int
 
 
+@dataclass
+class Trip:
+    start_time: datetime
+    end_time: datetime
+    start_lat: float
+    start_lon: float
+    end_lat: float
+    end_lon: float
+    point_count: int
+    distance_m: float
+    duration_sec: float
+    moving_time_sec: float
+    idle_time_sec: float
+    avg_speed_kmh: float
+    max_speed_kmh: float
+    p95_speed_kmh: float
+    jitter_rate: float
+
+
 @dataclass
 class ProcessedResult:
     raw_points: List[Ping]
     cleaned_points: List[Ping]
     jitter_point_ids: List[str]
+    idling_points: List[IdlingPoint]
+    trips: List[Trip] = field(default_factory=list)
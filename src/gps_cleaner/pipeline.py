@@ -1,18 +1,20 @@
 import argparse
-from typing import List
+from typing import List, Optional, Tuple
 
-from .config import load_config
+from .config import Config, load_config
 from .io import load_json_points, save_json, to_processed_json
 from .jitter_detection import JitterDetector
 from .smoothing import RouteSmoother
 from .idling import IdlingDetector
-from .models import ProcessedResult
+from .map_matching import MapMatcher, load_road_network
+from .trips import TripSegmenter
+from .utils_geo import epoch_seconds, track_steps
+from .models import Ping, ProcessedResult
 
 
-def run_pipeline(input_path: str, output_path: str, config_path: str) -> ProcessedResult:
-    cfg = load_config(config_path)
-    points = load_json_points(input_path)
-
+def build_stages(
+    cfg: Config,
+) -> Tuple[JitterDetector, RouteSmoother, IdlingDetector, Optional[MapMatcher], TripSegmenter]:
     jd = JitterDetector(
         max_speed_kmh=cfg.max_speed_kmh,
         speed_mad_threshold=cfg.speed_mad_threshold,
@@ -21,22 +23,71 @@ def run_pipeline(input_path: str, output_path: str, config_path: str) -> Process
         hampel_window_size=cfg.hampel_window_size,
         hampel_n_sigma=cfg.hampel_n_sigma,
     )
-    jitter_flags = jd.detect(points)
+    smoother = RouteSmoother(ema_alpha=cfg.ema_alpha)
+    id_detector = IdlingDetector(idle_speed_kmh=cfg.idle_speed_kmh, idle_min_duration_sec=cfg.idle_min_duration_sec)
+    segmenter = TripSegmenter(
+        trip_gap_sec=cfg.trip_gap_sec,
+        trip_split_idle_sec=cfg.trip_split_idle_sec,
+        idle_speed_kmh=cfg.idle_speed_kmh,
+        min_distance_m=cfg.trip_min_distance_m,
+        min_duration_sec=cfg.trip_min_duration_sec,
+    )
+
+    # Map matching is optional: only when a road network is configured
+    matcher = None
+    if cfg.road_network_path:
+        matcher = MapMatcher(
+            network=load_road_network(cfg.road_network_path, cell_size_m=cfg.snap_search_radius_m),
+            search_radius_m=cfg.snap_search_radius_m,
+            sigma_m=cfg.snap_sigma_m,
+            beta_m=cfg.snap_beta_m,
+            max_candidates=cfg.snap_max_candidates,
+        )
+    return jd, smoother, id_detector, matcher, segmenter
+
+
+def process_points(points: List[Ping], cfg: Config) -> ProcessedResult:
+    """
+    Run the jitter -> smoothing -> (map matching) -> idling -> trips chain on time-sorted points of a single track.
+    """
+    jd, smoother, id_detector, matcher, segmenter = build_stages(cfg)
+
+    # Columns and per-step distance/time/speed are shared by every stage
+    lats = [p.lat for p in points]
+    lons = [p.lon for p in points]
+    times_s = [epoch_seconds(p.gpstime) for p in points]
+    steps = track_steps(lats, lons, times_s)
+
+    jitter_flags = jd.detect_arrays(lats, lons, times_s, steps)
     jitter_ids = [p.id for p, flag in zip(points, jitter_flags) if flag]
 
-    smoother = RouteSmoother(ema_alpha=cfg.ema_alpha)
     cleaned_points = smoother.smooth(points, jitter_flags)
+    if matcher is not None:
+        cleaned_points = matcher.match(cleaned_points)
 
-    id_detector = IdlingDetector(idle_speed_kmh=cfg.idle_speed_kmh, idle_min_duration_sec=cfg.idle_min_duration_sec)
-    idling_points = id_detector.detect(points)  # Detect idling on raw points (configurable choice)
+    # Detect idling on raw points (configurable choice)
+    idle_segments = id_detector.detect_segments(lats, lons, times_s, steps)
+    idling_points = id_detector.points_from_segments(points, idle_segments)
 
-    result = ProcessedResult(
+    trips = segmenter.trips_from_summary(
+        points, segmenter.summarize(lats, lons, times_s, jitter_flags, idle_segments, steps)
+    )
+
+    return ProcessedResult(
         raw_points=points,
         cleaned_points=cleaned_points,
         jitter_point_ids=jitter_ids,
         idling_points=idling_points,
+        trips=trips,
     )
 
+
+def run_pipeline(input_path: str, output_path: str, config_path: str) -> ProcessedResult:
+    cfg = load_config(config_path)
+    points = load_json_points(input_path)
+
+    result = process_points(points, cfg)
+
     save_json(output_path, to_processed_json(result))
     return result
 
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Sequence, Tuple
 
 from .models import Ping
 from .utils_geo import exponential_moving_average
@@ -22,14 +22,19 @@ class RouteSmoother:
         if not kept:
             return []
 
-        lats = [p.lat for p in kept]
-        lons = [p.lon for p in kept]
-
-        lats_sm = exponential_moving_average(lats, self.ema_alpha)
-        lons_sm = exponential_moving_average(lons, self.ema_alpha)
+        lats_sm, lons_sm = self.smooth_arrays([p.lat for p in kept], [p.lon for p in kept])
 
         smoothed = []
         for p, lat_sm, lon_sm in zip(kept, lats_sm, lons_sm):
             smoothed.append(Ping(id=p.id, gpstime=p.gpstime, lat=lat_sm, lon=lon_sm))
 
         return smoothed
+
+    def smooth_arrays(self, lats: Sequence[float], lons: Sequence[float]) -> Tuple[List[float], List[float]]:
+        """
+        EMA on columnar coordinates of points already stripped of jitter.
+        """
+        return (
+            exponential_moving_average(list(lats), self.ema_alpha),
+            exponential_moving_average(list(lons), self.ema_alpha),
+        )
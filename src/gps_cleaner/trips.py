@@ -0,0 +1,193 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .models import Ping, Trip
+from .utils_geo import epoch_seconds, haversine_pairs_m, speeds_kmh
+
+_SUMMARY_COLUMNS = (
+    "start_index",
+    "end_index",
+    "point_count",
+    "distance_m",
+    "duration_sec",
+    "moving_time_sec",
+    "idle_time_sec",
+    "avg_speed_kmh",
+    "max_speed_kmh",
+    "p95_speed_kmh",
+    "jitter_rate",
+)
+
+
+class TripSegmenter:
+    """
+    Split a track into trips at time gaps longer than trip_gap_sec and at idling
+    segments lasting at least trip_split_idle_sec, and summarize each trip.
+
+    Jitter points are left out of distance and speed; steps below idle_speed_kmh
+    count as idle time within a trip. Runs shorter than min_distance_m or
+    min_duration_sec (e.g. GPS drift between two idles) are dropped. All
+    aggregates are computed in one pass with cumulative sums over the step
+    arrays.
+    """
+
+    def __init__(
+        self,
+        trip_gap_sec: float,
+        trip_split_idle_sec: float,
+        idle_speed_kmh: float,
+        min_distance_m: float = 0.0,
+        min_duration_sec: float = 0.0,
+    ):
+        self.trip_gap_sec = trip_gap_sec
+        self.trip_split_idle_sec = trip_split_idle_sec
+        self.idle_speed_kmh = idle_speed_kmh
+        self.min_distance_m = min_distance_m
+        self.min_duration_sec = min_duration_sec
+
+    def segment(
+        self, points: List[Ping], jitter_flags: Sequence[bool], idle_segments: List[Tuple[int, int, float]]
+    ) -> List[Trip]:
+        summary = self.summarize(
+            [p.lat for p in points],
+            [p.lon for p in points],
+            [epoch_seconds(p.gpstime) for p in points],
+            jitter_flags,
+            idle_segments,
+        )
+        return self.trips_from_summary(points, summary)
+
+    def summarize(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        times_s: Sequence[float],
+        jitter_flags: Sequence[bool],
+        idle_segments: List[Tuple[int, int, float]],
+        steps: Optional[Tuple[List[float], List[float], List[float]]] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Per-trip aggregates on columnar inputs, one array per column and one row per trip.
+        start_index / end_index refer to positions in the input arrays.
+        steps is the output of track_steps() on the raw points when the caller already has it.
+        """
+        jitter = np.asarray(jitter_flags, dtype=bool)
+
+        kept = np.flatnonzero(~jitter)
+        if len(kept) < 2:
+            return _empty_summary()
+
+        # Steps between consecutive non-jitter points: raw steps are reused where
+        # no jitter point was dropped in between, only bridging steps are recomputed
+        prev, cur = kept[:-1], kept[1:]
+        if steps is None:
+            distances_m = haversine_pairs_m(
+                np.take(lats, prev), np.take(lons, prev), np.take(lats, cur), np.take(lons, cur)
+            )
+            deltas_s = np.maximum(np.take(times_s, cur) - np.take(times_s, prev), 0.0)
+            speeds = np.asarray(speeds_kmh(distances_m, deltas_s))
+        else:
+            distances_m = np.asarray(steps[0], dtype=float)[cur]
+            deltas_s = np.asarray(steps[1], dtype=float)[cur]
+            speeds = np.asarray(steps[2], dtype=float)[cur]
+            bridge = np.flatnonzero(cur - prev > 1)
+            if len(bridge):
+                a, b = prev[bridge], cur[bridge]
+                distances_m[bridge] = haversine_pairs_m(
+                    np.take(lats, a), np.take(lons, a), np.take(lats, b), np.take(lons, b)
+                )
+                deltas_s[bridge] = np.maximum(np.take(times_s, b) - np.take(times_s, a), 0.0)
+                speeds[bridge] = speeds_kmh(distances_m[bridge], deltas_s[bridge])
+
+        # Label points inside idle segments long enough to end a trip
+        idle_label = np.full(len(jitter), -1, dtype=np.int64)
+        for label, (i, j, duration) in enumerate(idle_segments):
+            if duration >= self.trip_split_idle_sec:
+                idle_label[i : j + 1] = label
+        # As in IdlingDetector, a step's time belongs to the idle segment of its end point
+        in_long_idle = idle_label[kept[1:]] >= 0
+
+        in_trip = ~((deltas_s > self.trip_gap_sec) | in_long_idle)
+        edges = np.diff(np.concatenate(([0], in_trip.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)  # first step of each trip
+        stops = np.flatnonzero(edges == -1)  # one past the last step
+        if len(starts) == 0:
+            return _empty_summary()
+
+        def run_sums(values: np.ndarray) -> np.ndarray:
+            cs = np.concatenate(([0.0], np.cumsum(values)))
+            return cs[stops] - cs[starts]
+
+        distance = run_sums(distances_m)
+        duration = run_sums(deltas_s)
+        moving = run_sums(np.where(speeds >= self.idle_speed_kmh, deltas_s, 0.0))
+        avg_speed = np.divide(distance, duration, out=np.zeros_like(distance), where=duration > 0) * 3.6
+        max_speed = np.maximum.reduceat(np.where(in_trip, speeds, -np.inf), starts)
+
+        # 95th percentile per trip (linear interpolation, as np.percentile) from one sort
+        trip_of_step = np.cumsum(edges[:-1] == 1) - 1
+        step_ids = np.flatnonzero(in_trip)
+        order = np.lexsort((speeds[step_ids], trip_of_step[step_ids]))
+        sorted_speeds = speeds[step_ids][order]
+        counts = stops - starts
+        pos = np.concatenate(([0], np.cumsum(counts)[:-1])) + 0.95 * (counts - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        p95_speed = sorted_speeds[lo] + (sorted_speeds[hi] - sorted_speeds[lo]) * (pos - lo)
+
+        # Jitter rate over all raw points spanned by each trip
+        start_index = kept[starts]
+        end_index = kept[stops]
+        jitter_cs = np.concatenate(([0], np.cumsum(jitter)))
+        point_count = end_index - start_index + 1
+        jitter_rate = (jitter_cs[end_index + 1] - jitter_cs[start_index]) / point_count
+
+        summary = {
+            "start_index": start_index,
+            "end_index": end_index,
+            "point_count": point_count,
+            "distance_m": distance,
+            "duration_sec": duration,
+            "moving_time_sec": moving,
+            "idle_time_sec": duration - moving,
+            "avg_speed_kmh": avg_speed,
+            "max_speed_kmh": max_speed,
+            "p95_speed_kmh": p95_speed,
+            "jitter_rate": jitter_rate,
+        }
+        long_enough = (distance >= self.min_distance_m) & (duration >= self.min_duration_sec)
+        return {c: values[long_enough] for c, values in summary.items()}
+
+    @staticmethod
+    def trips_from_summary(points: List[Ping], summary: Dict[str, np.ndarray]) -> List[Trip]:
+        rows = zip(*(summary[c].tolist() for c in _SUMMARY_COLUMNS))
+        trips: List[Trip] = []
+        for i, j, count, distance, duration, moving, idle, avg, vmax, p95, jitter_rate in rows:
+            trips.append(
+                Trip(
+                    start_time=points[i].gpstime,
+                    end_time=points[j].gpstime,
+                    start_lat=points[i].lat,
+                    start_lon=points[i].lon,
+                    end_lat=points[j].lat,
+                    end_lon=points[j].lon,
+                    point_count=count,
+                    distance_m=distance,
+                    duration_sec=duration,
+                    moving_time_sec=moving,
+                    idle_time_sec=idle,
+                    avg_speed_kmh=avg,
+                    max_speed_kmh=vmax,
+                    p95_speed_kmh=p95,
+                    jitter_rate=jitter_rate,
+                )
+            )
+        return trips
+
+
+def _empty_summary() -> Dict[str, np.ndarray]:
+    return {
+        c: np.empty(0, dtype=np.int64 if c in ("start_index", "end_index", "point_count") else float)
+        for c in _SUMMARY_COLUMNS
+    }
@@ -1,4 +1,5 @@
 import math
+from datetime import datetime, timezone
 from typing import List, Tuple
 
 import numpy as np
@@ -7,6 +8,16 @@ import numpy as np
 EARTH_RADIUS_M = 6371000.0  # meters
 
 
+def epoch_seconds(t: datetime) -> float:
+    """
+    Seconds since the UTC epoch. Naive datetimes are read as UTC (not local time),
+    so differences match (b - a).total_seconds() even across DST changes.
+    """
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return t.timestamp()
+
+
 def haversine_distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
     Great-circle distance between two points on Earth (meters).
@@ -21,6 +32,43 @@ def haversine_distance_m(lat1: float, lon1: float, lat2: float, lon2: float) ->
     return EARTH_RADIUS_M * c
 
 
+def haversine_pairs_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Great-circle distances between paired arrays of points (meters).
+    """
+    phi1 = np.radians(np.asarray(lat1, dtype=float))
+    phi2 = np.radians(np.asarray(lat2, dtype=float))
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lon2, dtype=float) - np.asarray(lon1, dtype=float))
+
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
+def haversine_distances_m(lats, lons) -> np.ndarray:
+    """
+    Great-circle distances between consecutive points (meters); length is len(lats) - 1.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    return haversine_pairs_m(lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+
+def track_steps(lats, lons, times_s) -> Tuple[List[float], List[float], List[float]]:
+    """
+    Distance (m), time delta (s, negative clamped to 0) and speed (km/h) from the
+    previous point, one value per point; the first point gets 0 for all three.
+    Computed once per track and shared by the jitter, idling and trip stages.
+    """
+    if len(lats) < 2:
+        zeros = [0.0] * len(lats)
+        return zeros, list(zeros), list(zeros)
+    distances_m = np.concatenate(([0.0], haversine_distances_m(lats, lons)))
+    deltas_s = np.concatenate(([0.0], np.maximum(np.diff(np.asarray(times_s, dtype=float)), 0.0)))
+    return distances_m.tolist(), deltas_s.tolist(), speeds_kmh(distances_m, deltas_s)
+
+
 def bearing_deg(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
     Initial bearing from point 1 to point 2 (degrees).
@@ -106,13 +154,10 @@ def speeds_kmh(distances_m: List[float], deltas_s: List[float]) -> List[float]:
     Compute speed in km/h for each segment (distance over time).
     Speed value is assigned to the second point of the segment.
     """
-    speeds = []
-    for d, t in zip(distances_m, deltas_s):
-        if t <= 0:
-            speeds.append(0.0)
-            continue
-        speeds.append((d / t) * 3.6)
-    return speeds
+    d = np.asarray(distances_m, dtype=float)
+    t = np.asarray(deltas_s, dtype=float)
+    speeds = np.divide(d, t, out=np.zeros_like(d), where=t > 0) * 3.6
+    return speeds.tolist()
 
 
 def compute_bearing_changes(bearings: List[float]) -> List[float]:
@@ -122,3 +167,4 @@ def compute_bearing_changes(bearings: List[float]) -> List[float]:
     bc = [0.0]
     for i in range(1, len(bearings)):
         bc.append(angular_difference_deg(bearings[i], bearings[i - 1]))
+    return bc
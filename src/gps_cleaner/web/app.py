@@ -3,11 +3,8 @@ from pathlib import Path
 import tempfile
 
 from gps_cleaner.config import load_config
-from gps_cleaner.pipeline import run_pipeline
+from gps_cleaner.pipeline import run_pipeline, process_points
 from gps_cleaner.io import load_json_points, to_geojson
-from gps_cleaner.jitter_detection import JitterDetector
-from gps_cleaner.smoothing import RouteSmoother
-from gps_cleaner.idling import IdlingDetector
 from gps_cleaner.models import ProcessedResult
 
 app = Flask(
@@ -42,29 +39,7 @@ def process():
 
     # Run in-memory pipeline
     points = load_json_points(input_path)
-    jd = JitterDetector(
-        max_speed_kmh=cfg.max_speed_kmh,
-        speed_mad_threshold=cfg.speed_mad_threshold,
-        bearing_change_threshold_deg=cfg.bearing_change_threshold_deg,
-        min_distance_meters=cfg.min_distance_meters,
-        hampel_window_size=cfg.hampel_window_size,
-        hampel_n_sigma=cfg.hampel_n_sigma,
-    )
-    jitter_flags = jd.detect(points)
-    jitter_ids = [p.id for p, flag in zip(points, jitter_flags) if flag]
-
-    smoother = RouteSmoother(ema_alpha=cfg.ema_alpha)
-    cleaned_points = smoother.smooth(points, jitter_flags)
-
-    id_detector = IdlingDetector(idle_speed_kmh=cfg.idle_speed_kmh, idle_min_duration_sec=cfg.idle_min_duration_sec)
-    idling_points = id_detector.detect(points)
-
-    _last_result = ProcessedResult(
-        raw_points=points,
-        cleaned_points=cleaned_points,
-        jitter_point_ids=jitter_ids,
-        idling_points=idling_points,
-    )
+    _last_result = process_points(points, cfg)
     return render_template("map.html")
 
 
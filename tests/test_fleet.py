@@ -0,0 +1,47 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from gps_cleaner.config import Config
+from gps_cleaner.fleet import run_fleet
+from gps_cleaner.io import load_json_points
+from gps_cleaner.models import Ping
+from gps_cleaner.pipeline import process_points
+
+
+def make_track(device_id, n, lat0):
+    base = datetime(2025, 11, 13, 1, 0, 0, tzinfo=timezone.utc)
+    points = []
+    for i in range(n):
+        lat = lat0 + i * 1e-4 if i < n // 2 else lat0 + (n // 2) * 1e-4  # second half idles
+        points.append(Ping(id=f"{device_id}-{i}", gpstime=base + timedelta(seconds=30 * i), lat=lat, lon=72.8852))
+    # jitter spike
+    points[3] = Ping(id=points[3].id, gpstime=points[3].gpstime, lat=lat0 + 0.05, lon=72.95)
+    return points
+
+def test_fleet_matches_single_track_pipeline():
+    cfg = Config.from_dict({})
+    tracks = {
+        "sample": load_json_points("data/sample/sample_raw.json"),
+        "a": make_track("a", 40, 19.45),
+        "b": make_track("b", 25, 19.50),
+        "empty": [],
+    }
+
+    results = run_fleet(tracks, cfg, max_workers=2)
+
+    assert set(results) == {"sample", "a", "b"}
+    for device_id, result in results.items():
+        expected = process_points(tracks[device_id], cfg)
+        assert result.jitter_point_ids == expected.jitter_point_ids
+        assert [p.id for p in result.cleaned_points] == [p.id for p in expected.cleaned_points]
+        for got, want in zip(result.cleaned_points, expected.cleaned_points):
+            assert got.lat == pytest.approx(want.lat)
+            assert got.lon == pytest.approx(want.lon)
+        assert result.idling_points == expected.idling_points
+        assert result.trips == expected.trips
+    assert "a-3" in results["a"].jitter_point_ids
+    assert results["a"].idling_points
+
+def test_fleet_empty_input():
+    assert run_fleet({}, Config.from_dict({})) == {}
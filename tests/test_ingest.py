@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from gps_cleaner import ingest
+from gps_cleaner.config import Config
+from gps_cleaner.ingest import IngestionServer, parse_batch
+from gps_cleaner.io import ping_from_dict, to_processed_json
+from gps_cleaner.pipeline import process_points
+
+
+def make_config(**overrides):
+    return Config.from_dict({"ingest_buffer_size": 10, "ingest_flush_size": 5, "ingest_flush_interval_sec": 0.05, **overrides})
+
+def make_item(device_id, i):
+    return {"device_id": device_id, "id": f"{device_id}-{i}", "gpstime": f"2025-11-13T01:{i:02d}:00+00:00", "lat": 19.4591 + i * 1e-4, "lon": 72.8852}
+
+async def call(app, method, path, body=b""):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({"type": "http", "method": method, "path": path}, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+def test_parse_batch_ndjson_and_array():
+    items = [make_item("a", 1), make_item("b", 2)]
+    ndjson = "\n".join(json.dumps(it) for it in items).encode()
+    array = json.dumps(items).encode()
+    for body in (ndjson, array):
+        parsed = parse_batch(body)
+        assert [d for d, _ in parsed] == ["a", "b"]
+        assert parsed[1][1].id == "b-2"
+
+def test_parse_batch_naive_time_is_utc():
+    naive = {**make_item("a", 1), "gpstime": "2025-11-13T01:01:00"}
+    parsed = parse_batch(json.dumps([make_item("a", 2), naive]).encode())
+    assert parsed[1][1].gpstime.utcoffset().total_seconds() == 0
+    assert parsed[1][1].gpstime < parsed[0][1].gpstime
+
+def test_mixed_time_zones_do_not_stall_device():
+    async def scenario():
+        app = IngestionServer(make_config(), executor=ThreadPoolExecutor(max_workers=1))
+        naive = {**make_item("a", 2), "gpstime": "2025-11-13T01:02:00"}
+        status, _ = await call(app, "POST", "/ingest", json.dumps([make_item("a", 1), naive]).encode())
+        assert status == 202
+        await asyncio.wait_for(app.drain(), timeout=5)
+        _, stats = await call(app, "GET", "/stats")
+        assert stats["failed"] == 0
+        await asyncio.wait_for(app.close(), timeout=5)
+
+    asyncio.run(scenario())
+
+def test_ingest_processes_per_device():
+    async def scenario():
+        app = IngestionServer(make_config(), executor=ThreadPoolExecutor(max_workers=2))
+        items = [make_item(dev, i) for dev in ("a", "b") for i in range(8)]
+        status, payload = await call(app, "POST", "/ingest", json.dumps(items).encode())
+        assert status == 202
+        assert payload["accepted"] == 16
+        await app.drain()
+        status, payload = await call(app, "GET", "/stats")
+        # The newest half Hampel window (2 pings) of each device waits for the next batch
+        assert payload["processed"] == 12
+        assert payload["buffered"] == 0
+        assert payload["in_flight"] == 0
+        assert payload["devices"] == 2
+        status, payload = await call(app, "GET", "/devices/a")
+        assert status == 200
+        assert len(payload["raw_points"]) > 0
+        await app.close()
+
+    asyncio.run(scenario())
+
+def test_ingest_backpressure_returns_503():
+    async def scenario():
+        # Tiny buffer and a busy worker: the queue fills and the request times out
+        cfg = make_config(ingest_buffer_size=2, ingest_flush_size=1, ingest_put_timeout_sec=0.05)
+        executor = ThreadPoolExecutor(max_workers=1)
+        release = threading.Event()
+        executor.submit(release.wait)
+        app = IngestionServer(cfg, executor=executor)
+        items = [make_item("a", i) for i in range(10)]
+        status, payload = await call(app, "POST", "/ingest", json.dumps(items).encode())
+        assert status == 503
+        assert payload["accepted"] < 10
+        assert payload["accepted"] + payload["rejected"] == 10
+        release.set()
+        await app.close()
+
+    asyncio.run(scenario())
+
+def test_ingest_rejects_malformed_batch():
+    async def scenario():
+        app = IngestionServer(make_config(), executor=ThreadPoolExecutor(max_workers=1))
+        status, payload = await call(app, "POST", "/ingest", b'{"id": "x"}')
+        assert status == 400
+        await app.close()
+
+    asyncio.run(scenario())
+
+def test_stream_one_ping_at_a_time_matches_single_pass():
+    async def scenario():
+        cfg = make_config(ingest_flush_size=50)
+        # Drive 5 minutes at ~30 km/h, then park for 15: the idle run spans many single-ping batches
+        items = [{**make_item("a", i), "lat": 19.4591 + min(i, 4) * 5e-3} for i in range(20)]
+        app = IngestionServer(cfg, executor=ThreadPoolExecutor(max_workers=1))
+        for item in items:
+            status, _ = await call(app, "POST", "/ingest", json.dumps([item]).encode())
+            assert status == 202
+            await app.drain()
+        status, streamed = await call(app, "GET", "/devices/a")
+        await app.close()
+        assert status == 200
+
+        assert len(streamed["raw_points"]) == 18
+        expected = json.loads(json.dumps(to_processed_json(process_points([ping_from_dict(it) for it in items[:18]], cfg))))
+        assert len(streamed["idling_points"]) == 1
+        assert streamed["idling_points"] == expected["idling_points"]
+        assert streamed["jitter_point_ids"] == expected["jitter_point_ids"]
+        assert streamed["cleaned_points"] == expected["cleaned_points"]
+        assert streamed["trips"] == expected["trips"]
+
+    asyncio.run(scenario())
+
+def test_ingest_limits_tracked_devices():
+    async def scenario():
+        app = IngestionServer(make_config(ingest_max_devices=2), executor=ThreadPoolExecutor(max_workers=1))
+        items = [make_item(dev, 1) for dev in ("a", "b", "c", "a")]
+        status, payload = await call(app, "POST", "/ingest", json.dumps(items).encode())
+        assert status == 503
+        assert payload == {"accepted": 2, "rejected": 2}
+        await app.close()
+
+    asyncio.run(scenario())
+
+def test_idle_device_is_dropped():
+    async def scenario():
+        app = IngestionServer(make_config(ingest_device_idle_sec=0.1), executor=ThreadPoolExecutor(max_workers=1))
+        await call(app, "POST", "/ingest", json.dumps([make_item("a", i) for i in range(5)]).encode())
+        await app.drain()
+        status, _ = await call(app, "GET", "/devices/a")
+        assert status == 200
+        await asyncio.sleep(0.3)
+        status, _ = await call(app, "GET", "/devices/a")
+        assert status == 404
+        _, stats = await call(app, "GET", "/stats")
+        assert stats["devices"] == 0
+        assert stats["expired"] == 1
+        await app.close()
+
+    asyncio.run(scenario())
+
+def test_ingest_rejects_oversized_body():
+    async def scenario():
+        app = IngestionServer(make_config(ingest_max_body_bytes=100), executor=ThreadPoolExecutor(max_workers=1))
+        items = [make_item("a", i) for i in range(5)]
+        status, _ = await call(app, "POST", "/ingest", json.dumps(items).encode())
+        assert status == 413
+        _, stats = await call(app, "GET", "/stats")
+        assert stats["received"] == 0
+        await app.close()
+
+    asyncio.run(scenario())
+
+class FailingExecutor(ThreadPoolExecutor):
+    def __init__(self, error):
+        super().__init__(max_workers=1)
+        self.error = error
+
+    def submit(self, *args, **kwargs):
+        raise self.error
+
+def test_failed_batch_is_logged_with_device(caplog):
+    async def scenario():
+        app = IngestionServer(make_config(), executor=FailingExecutor(RuntimeError("boom")))
+        status, _ = await call(app, "POST", "/ingest", json.dumps([make_item("dev-7", 1)]).encode())
+        assert status == 202
+        await app.drain()
+        _, stats = await call(app, "GET", "/stats")
+        assert stats["failed"] == 1
+        await app.close()
+
+    with caplog.at_level(logging.ERROR, logger="gps_cleaner.ingest"):
+        asyncio.run(scenario())
+    assert any("dev-7" in r.getMessage() and r.exc_info for r in caplog.records)
+
+def test_broken_pool_is_replaced(monkeypatch):
+    monkeypatch.setattr(ingest, "ProcessPoolExecutor", lambda **kwargs: ThreadPoolExecutor(max_workers=1))
+
+    async def scenario():
+        app = IngestionServer(make_config())
+        app._executor = FailingExecutor(BrokenProcessPool("worker died"))
+        status, _ = await call(app, "POST", "/ingest", json.dumps([make_item("a", i) for i in range(5)]).encode())
+        assert status == 202
+        await app.drain()
+        _, stats = await call(app, "GET", "/stats")
+        assert stats["processed"] == 3
+        assert stats["failed"] == 0
+        await app.close()
+
+    asyncio.run(scenario())
+
+def test_idle_longer_than_flush_size_is_kept_whole():
+    async def scenario():
+        cfg = make_config(ingest_buffer_size=100, ingest_flush_size=20)
+        # 1 Hz: drive 1 minute at 36 km/h, park 5 minutes, drive 1 minute
+        items = []
+        north = 0.0
+        for i in range(420):
+            if i < 60 or i >= 360:
+                north += 10
+            t = f"2025-11-13T01:{i // 60:02d}:{i % 60:02d}+00:00"
+            items.append({"device_id": "a", "id": f"a-{i}", "gpstime": t, "lat": 19.4 + north / 111195, "lon": 72.88})
+        app = IngestionServer(cfg, executor=ThreadPoolExecutor(max_workers=1))
+        for start in range(0, len(items), 20):
+            status, _ = await call(app, "POST", "/ingest", json.dumps(items[start : start + 20]).encode())
+            assert status == 202
+            await app.drain()
+        status, streamed = await call(app, "GET", "/devices/a")
+        await app.close()
+        assert status == 200
+
+        n = len(streamed["raw_points"])
+        expected = json.loads(json.dumps(to_processed_json(process_points([ping_from_dict(it) for it in items[:n]], cfg))))
+        assert len(streamed["idling_points"]) == 1
+        assert streamed["idling_points"][0]["duration_sec"] == 300
+        assert streamed["idling_points"] == expected["idling_points"]
+        assert streamed["trips"] == expected["trips"]
+
+    asyncio.run(scenario())
+
+def test_noisy_track_jitter_matches_single_pass():
+    async def scenario(seed):
+        rng = random.Random(seed)
+        cfg = make_config()
+        # 1 Hz with GPS noise and occasional 300 m spikes
+        items = []
+        north = 0.0
+        for i in range(300):
+            north += rng.uniform(5, 15)
+            dn = rng.gauss(0, 3) + (300 if rng.random() < 0.03 else 0)
+            t = f"2025-11-13T01:{i // 60:02d}:{i % 60:02d}+00:00"
+            items.append({"device_id": "a", "id": f"a-{i}", "gpstime": t, "lat": 19.4 + (north + dn) / 111195, "lon": 72.88 + rng.gauss(0, 3) / 105000})
+        app = IngestionServer(cfg, executor=ThreadPoolExecutor(max_workers=1))
+        for start in range(0, len(items), 5):
+            await call(app, "POST", "/ingest", json.dumps(items[start : start + 5]).encode())
+            await app.drain()
+        _, streamed = await call(app, "GET", "/devices/a")
+        await app.close()
+
+        n = len(streamed["raw_points"])
+        expected = process_points([ping_from_dict(it) for it in items[:n]], cfg)
+        assert expected.jitter_point_ids
+        assert streamed["jitter_point_ids"] == expected.jitter_point_ids
+
+    for seed in (1, 2, 5, 6, 7):
+        asyncio.run(scenario(seed))
@@ -0,0 +1,116 @@
+import json
+import math
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+from gps_cleaner.config import Config
+from gps_cleaner.map_matching import MapMatcher, RoadNetwork, load_road_network
+from gps_cleaner.models import Ping
+from gps_cleaner.pipeline import process_points
+
+LAT0, LON0 = 19.4591, 72.8852
+M_PER_DEG_LAT = 111195.0
+M_PER_DEG_LON = M_PER_DEG_LAT * math.cos(math.radians(LAT0))
+
+def offset(east_m, north_m):
+    return LAT0 + north_m / M_PER_DEG_LAT, LON0 + east_m / M_PER_DEG_LON
+
+def line(*pts_m):
+    return [tuple(reversed(offset(e, n))) for e, n in pts_m]  # (lon, lat)
+
+def make_matcher(lines):
+    network = RoadNetwork(lines, cell_size_m=50)
+    return MapMatcher(network, search_radius_m=50, sigma_m=10, beta_m=20, max_candidates=5)
+
+def north_m(lat):
+    return (lat - LAT0) * M_PER_DEG_LAT
+
+def east_m(lon):
+    return (lon - LON0) * M_PER_DEG_LON
+
+def test_candidates_sorted_and_bounded():
+    # Roads along y=0 and y=30 (meters)
+    network = RoadNetwork([line((0, 0), (500, 0)), line((0, 30), (500, 30))], cell_size_m=50)
+    x, y = network.project(*zip(offset(100, 10), offset(100, 200)))
+    seg, dist, xy = network.candidates(np.asarray(x), np.asarray(y), radius_m=50, max_candidates=5)
+    assert seg[0, 0] == 0 and seg[0, 1] == 1
+    assert abs(dist[0, 0] - 10) < 0.5 and abs(dist[0, 1] - 20) < 0.5
+    assert np.all(seg[1] == -1)  # nothing within radius
+
+def test_snaps_to_corner_route():
+    matcher = make_matcher([line((0, 0), (200, 0), (200, 200))])
+    track = [offset(e, n) for e, n in [(20, 6), (80, -5), (150, 7), (195, 8), (205, 60), (193, 140), (207, 190)]]
+    lats, lons = matcher.match_arrays([p[0] for p in track], [p[1] for p in track])
+    for lat, lon in zip(lats, lons):
+        e, n = east_m(lon), north_m(lat)
+        assert min(abs(n), abs(e - 200)) < 0.5
+
+def test_stays_on_road_when_single_point_drifts():
+    # Two parallel roads 30 m apart; one point drifts slightly closer to the wrong one
+    matcher = make_matcher([line((0, 0), (500, 0)), line((0, 30), (500, 30))])
+    track = [offset(e, n) for e, n in [(0, 2), (20, -3), (40, 16), (60, 1), (80, -2)]]
+    lats, _ = matcher.match_arrays([p[0] for p in track], [p[1] for p in track])
+    assert all(abs(north_m(lat)) < 0.5 for lat in lats)
+
+def test_points_without_roads_are_kept():
+    matcher = make_matcher([line((0, 0), (100, 0))])
+    track = [offset(10, 5), offset(1000, 1000), offset(50, -5)]
+    lats, lons = matcher.match_arrays([p[0] for p in track], [p[1] for p in track])
+    assert abs(lats[1] - track[1][0]) < 1e-9 and abs(lons[1] - track[1][1]) < 1e-9
+    assert abs(north_m(lats[0])) < 0.5 and abs(north_m(lats[2])) < 0.5
+
+def test_load_osm_extract(tmp_path):
+    (lat_a, lon_a), (lat_b, lon_b) = offset(0, 0), offset(300, 0)
+    osm = tmp_path / "roads.osm"
+    osm.write_text(
+        f"""<osm>
+  <node id="1" lat="{lat_a}" lon="{lon_a}"/>
+  <node id="2" lat="{lat_b}" lon="{lon_b}"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><tag k="highway" v="residential"/></way>
+  <way id="11"><nd ref="1"/><nd ref="2"/><tag k="building" v="yes"/></way>
+</osm>"""
+    )
+    network = load_road_network(str(osm), cell_size_m=50)
+    assert len(network) == 1
+
+def test_pipeline_snaps_cleaned_points(tmp_path):
+    roads = tmp_path / "roads.geojson"
+    roads.write_text(json.dumps({
+        "type": "FeatureCollection",
+        "features": [{"type": "Feature", "geometry": {"type": "LineString", "coordinates": line((0, 0), (1000, 0))}, "properties": {}}],
+    }))
+    base = datetime(2025, 11, 13, 1, 0, 0, tzinfo=timezone.utc)
+    points = []
+    for i in range(10):
+        lat, lon = offset(i * 50, 8 if i % 2 else -8)
+        points.append(Ping(id=f"p{i}", gpstime=base + timedelta(seconds=10 * i), lat=lat, lon=lon))
+
+    result = process_points(points, Config.from_dict({"road_network_path": str(roads)}))
+    assert len(result.cleaned_points) == len(points)
+    assert all(abs(north_m(p.lat)) < 0.5 for p in result.cleaned_points)
+
+def test_index_size_linear_in_segment_length():
+    # A single 20 km diagonal segment indexed with 10 m cells
+    network = RoadNetwork([line((0, 0), (14142, 14142))], cell_size_m=10)
+    assert len(network._cell_keys) < 10000
+    x, y = network.project(*zip(offset(7000, 7010)))
+    seg, dist, _ = network.candidates(np.asarray(x), np.asarray(y), radius_m=10, max_candidates=5)
+    assert seg[0, 0] == 0 and abs(dist[0, 0] - 7.07) < 0.1
+
+def test_road_network_reloaded_when_file_changes(tmp_path):
+    import os
+
+    roads = tmp_path / "roads.geojson"
+    def write(*lines):
+        features = [{"type": "Feature", "geometry": {"type": "LineString", "coordinates": l}, "properties": {}} for l in lines]
+        roads.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+
+    write(line((0, 0), (100, 0)))
+    first = load_road_network(str(roads), cell_size_m=50)
+    assert load_road_network(str(roads), cell_size_m=50) is first
+
+    write(line((0, 0), (100, 0)), line((0, 50), (100, 50)))
+    st = roads.stat()
+    os.utime(roads, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert len(load_road_network(str(roads), cell_size_m=50)) == 2
@@ -0,0 +1,113 @@
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+import pytest
+
+from gps_cleaner.config import Config
+from gps_cleaner.idling import IdlingDetector
+from gps_cleaner.io import to_geojson, to_processed_json
+from gps_cleaner.models import Ping
+from gps_cleaner.pipeline import process_points
+from gps_cleaner.trips import TripSegmenter
+from gps_cleaner.utils_geo import epoch_seconds
+
+M_PER_DEG_LAT = 111195.0
+
+def build_track():
+    """
+    Drive north at 10 m/s, idle 6 minutes, drive again, 20 minute gap, drive again.
+    Pings every 30 s.
+    """
+    base = datetime(2025, 11, 13, 1, 0, 0, tzinfo=timezone.utc)
+    points = []
+    t = 0
+    north = 0.0
+
+    def add():
+        points.append(Ping(id=f"p{len(points)}", gpstime=base + timedelta(seconds=t), lat=19.4 + north / M_PER_DEG_LAT, lon=72.88))
+
+    add()
+    for _ in range(10):
+        t += 30; north += 300; add()
+    for _ in range(12):
+        t += 30; add()
+    for _ in range(10):
+        t += 30; north += 300; add()
+    t += 1200
+    add()
+    for _ in range(5):
+        t += 30; north += 300; add()
+    return points
+
+def segment(points, jitter_flags=None):
+    jitter_flags = jitter_flags or [False] * len(points)
+    idler = IdlingDetector(idle_speed_kmh=3, idle_min_duration_sec=120)
+    segments = idler.detect_segments([p.lat for p in points], [p.lon for p in points], [epoch_seconds(p.gpstime) for p in points])
+    return TripSegmenter(trip_gap_sec=600, trip_split_idle_sec=300, idle_speed_kmh=3).segment(points, jitter_flags, segments)
+
+def test_trips_split_at_idle_and_gap():
+    trips = segment(build_track())
+    assert len(trips) == 3
+    assert [round(t.distance_m / 100) for t in trips] == [30, 30, 15]
+    for trip in trips:
+        assert trip.avg_speed_kmh == pytest.approx(36, rel=1e-3)
+        assert trip.p95_speed_kmh == pytest.approx(36, rel=1e-3)
+        assert trip.idle_time_sec == 0
+        assert trip.moving_time_sec == trip.duration_sec
+        assert trip.jitter_rate == 0
+
+def test_short_idle_counts_as_idle_time():
+    points = build_track()
+    det = TripSegmenter(trip_gap_sec=600, trip_split_idle_sec=1000, idle_speed_kmh=3)
+    trips = det.segment(points, [False] * len(points), [])
+    assert len(trips) == 2
+    assert trips[0].idle_time_sec == pytest.approx(360)
+    assert trips[0].moving_time_sec == pytest.approx(600)
+
+def test_p95_and_jitter_rate_with_spike():
+    points = build_track()[:11]
+    # Make one step faster and add a jitter spike
+    points[5:] = [Ping(id=p.id, gpstime=p.gpstime, lat=p.lat + 300 / M_PER_DEG_LAT, lon=p.lon) for p in points[5:]]
+    points[8] = Ping(id="j", gpstime=points[8].gpstime, lat=points[8].lat + 0.05, lon=points[8].lon)
+    flags = [False] * len(points)
+    flags[8] = True
+
+    trips = segment(points, flags)
+    assert len(trips) == 1
+    kept = [p for p, f in zip(points, flags) if not f]
+    speeds = [
+        (b.lat - a.lat) * M_PER_DEG_LAT / (b.gpstime - a.gpstime).total_seconds() * 3.6 for a, b in zip(kept, kept[1:])
+    ]
+    assert trips[0].p95_speed_kmh == pytest.approx(np.percentile(speeds, 95), rel=1e-3)
+    assert trips[0].max_speed_kmh == pytest.approx(max(speeds), rel=1e-3)
+    assert trips[0].jitter_rate == pytest.approx(1 / 11)
+
+def test_trips_in_outputs():
+    result = process_points(build_track(), Config.from_dict({}))
+    assert len(result.trips) == 3
+    out = to_processed_json(result)
+    assert len(out["trips"]) == 3
+    assert out["trips"][0]["distance_m"] > 0
+    features = [f for f in to_geojson(result)["features"] if f["properties"].get("type") == "trip"]
+    assert len(features) == 3
+    assert len(features[0]["geometry"]["coordinates"]) == 11
+
+def test_drift_between_idles_is_not_a_trip():
+    base = datetime(2025, 11, 13, 1, 0, 0, tzinfo=timezone.utc)
+    # Parked 10 min, one 40 m drift out and back, parked 10 min
+    offsets = [0.0] * 21 + [40.0] + [0.0] * 21
+    points = [
+        Ping(id=f"p{i}", gpstime=base + timedelta(seconds=30 * i), lat=19.4 + north / M_PER_DEG_LAT, lon=72.88)
+        for i, north in enumerate(offsets)
+    ]
+    idler = IdlingDetector(idle_speed_kmh=3, idle_min_duration_sec=120)
+    segments = idler.detect_segments([p.lat for p in points], [p.lon for p in points], [epoch_seconds(p.gpstime) for p in points])
+    assert len(segments) == 2
+
+    loose = TripSegmenter(trip_gap_sec=600, trip_split_idle_sec=300, idle_speed_kmh=3)
+    assert len(loose.segment(points, [False] * len(points), segments)) == 1
+    strict = TripSegmenter(
+        trip_gap_sec=600, trip_split_idle_sec=300, idle_speed_kmh=3, min_distance_m=100, min_duration_sec=60
+    )
+    assert strict.segment(points, [False] * len(points), segments) == []
+    assert process_points(points, Config.from_dict({})).trips == []
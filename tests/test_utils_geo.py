@@ -22,3 +22,19 @@ def test_ema_basic():
     ema = exponential_moving_average(arr, alpha=0.5)
     assert len(ema) == 3
     assert abs(ema[-1] - 15) < 1e-6
+
+def test_epoch_seconds_naive_ignores_local_dst(monkeypatch):
+    import time
+    from datetime import datetime
+    from gps_cleaner.utils_geo import epoch_seconds
+
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    time.tzset()
+    try:
+        # Clocks jump 02:00 -> 03:00 local on this date; naive times must not see it
+        a = datetime(2025, 3, 30, 1, 30)
+        b = datetime(2025, 3, 30, 3, 30)
+        assert epoch_seconds(b) - epoch_seconds(a) == (b - a).total_seconds()
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()